@@ -160,7 +160,8 @@ setup(
                  "pytest-cov>=4.0.0",
                  "pytest-html>=3.2.0",
                  "pytest-sugar>=0.9.6",
-                 "pytest-xdist>=3.0.2", ],
+                 "pytest-xdist>=3.0.2",
+                 "importlib-metadata; python_version < '3.8'", ],
     },
     # If there are data files included in your packages that need to be
     # installed, specify them here.
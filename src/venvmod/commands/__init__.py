@@ -33,7 +33,7 @@ def get_parser(  # name: str,  # pylint: disable=too-many-arguments
     Returns
     -------
     argparse.Namespace
-        parsed arguments
+        parsed arguments, ``virtual_env`` being an absolute Path
     """
 
     parser = argparse.ArgumentParser(description=description)
@@ -73,8 +73,10 @@ def get_parser(  # name: str,  # pylint: disable=too-many-arguments
     else:
         logger.setLevel(logging.INFO)
 
-    check_raise(not Path(parsered.virtual_env).absolute().is_dir(),
+    virtual_env = Path(parsered.virtual_env).absolute()
+    check_raise(not virtual_env.is_dir(),
                 FileNotFoundError, f"virtual environment '{parsered.virtual_env}' does not exist.")
+    parsered.virtual_env = virtual_env
 
     return parsered
 
@@ -3,7 +3,7 @@ To append instructions in modulefile.
 """
 import os
 from pathlib import Path
-from typing import Any, List, Tuple
+from typing import Any, Iterable, List, Tuple
 
 from venvmod.tools import get_std_name, logger
 
@@ -37,14 +37,50 @@ def append_command(arguments: Tuple[str, str, str],
         logger.debug("append_command virtual_env '%s'", virtual_env)
         appli = options.appli
         logger.debug("append_command appli '%s'", appli)
-        arguments = ""
-        for positional in positionals:
-            values = vars(options)[positional[0]]
-            logger.debug("append_command positional '%s': '%s'", positional, values)
-            arguments += " " + " ".join(values)
+        values = [vars(options)[positional[0]] for positional in positionals]
+        logger.debug("append_command positionals '%s': '%s'", positionals, values)
+        arguments = "".join(" " + " ".join(value) for value in values)
     else:
         virtual_env, appli, arguments = arguments
 
+    write_commands(virtual_env=virtual_env, appli=appli,
+                   command=command, arguments_list=(arguments,))
+
+
+def write_commands(virtual_env: str,
+                   appli: str,
+                   command: str,
+                   arguments_list: Iterable[str]):
+    """Append several lines of the same command to a modulefile in a single write.
+
+    Parameters
+    ----------
+    virtual_env : str
+        Path to the virtual env
+    appli : str
+        Name of the appli modulefile
+    command : str
+        Name of the command
+    arguments_list : Iterable[str]
+        Arguments of the command, one line is written per element
+    """
+    prefix = f"{command} "
+    write_lines(virtual_env=virtual_env, appli=appli,
+                lines=[prefix + arguments for arguments in arguments_list])
+
+
+def write_lines(virtual_env: str, appli: str, lines: List[str]):
+    """Append staged lines to a modulefile with a single open and write.
+
+    Parameters
+    ----------
+    virtual_env : str
+        Path to the virtual env
+    appli : str
+        Name of the appli modulefile
+    lines : List[str]
+        Lines to append, without trailing new line
+    """
     filepath = get_module_filepath(virtual_env=Path(virtual_env).absolute(), appli_name=appli)
 
     check_raise(not filepath.exists(), FileNotFoundError,
@@ -53,7 +89,7 @@ def append_command(arguments: Tuple[str, str, str],
                 f" or 'venvmod-add-appli {virtual_env} {filepath.name}' first.")
 
     with filepath.open(mode='a', encoding='utf-8') as modulefile:
-        modulefile.write(f"{command} {arguments}\n")
+        modulefile.write("".join(line + "\n" for line in lines))
 
 
 def module_use(arguments: Tuple[str, str, str] = None):
@@ -191,7 +227,7 @@ def set_aliases(arguments: Tuple[str, str, str] = None):
                    command="set-alias")
 
 
-def read_env(arguments: Tuple[str, str] = None):  # pylint: disable=too-many-branches
+def read_env(arguments: Tuple[str, str] = None):
     """Add commands to a modulefile from environment variables.
 
     Parse ``os.environ`` to look at variable starting with 'appli' (case insensitive) name.
@@ -223,67 +259,58 @@ def read_env(arguments: Tuple[str, str] = None):  # pylint: disable=too-many-bra
     if arguments is None:
         options = get_parser(description="Read environment variable to extend modulefile.",
                              with_appli=True)
-        appli = options.appli if options.appli else options.virtual_env
-        appli = get_std_name(str(Path(appli).name))  # virtual_env may be a path
+        appli = options.appli if options.appli else str(options.virtual_env)
+        appli = get_std_name(os.path.basename(appli.rstrip(os.sep)))  # virtual_env may be a path
         virtual_env = options.virtual_env
     else:
         virtual_env, appli = arguments
 
-    # List env vars
-    appli_env_vars = {envvar: value for envvar, value in os.environ.items()
-                      if get_std_name(envvar).startswith(appli.replace('.', '_'))}
+    # List env vars, keyed by their suffix ('APPLI_SUFFIX' convention)
+    prefix = get_std_name(appli.replace('.', '_')) + "-"
+    appli_env_vars = {envvar[len(prefix):].upper(): value for envvar, value in os.environ.items()
+                      if get_std_name(envvar).startswith(prefix)}
 
     logger.debug("read_env: os.environ = '%s'", os.environ)
     logger.debug("read_env: appli_env_vars = '%s'", appli_env_vars)
 
-    # Source file in first
-    _read_src_files(virtual_env, appli_env_vars, appli)
-    # modules
-    _read_modules(virtual_env, appli_env_vars, appli)
-    # prepend
-    _read_prepend(virtual_env, appli_env_vars, appli)
-    # other, remove is at the end
-    _read_others(virtual_env, appli_env_vars, appli)
-
-
-def _read_src_files(virtual_env, appli_env_vars, appli):
-    for envvar, value in appli_env_vars.copy().items():
-        if envvar.endswith("SOURCEFILES"):
-            for var in value.split(";"):
-                if var:
-                    source_sh(arguments=(virtual_env, appli, var))
-            appli_env_vars.pop(envvar)
-            break
-
-
-def _read_modules(virtual_env, appli_env_vars, appli):
-    for suffix, function in {
-            "MODULE_USE": module_use,
-            "MODULEFILES": module_load}.items():
-        for envvar, value in appli_env_vars.copy().items():
-            if envvar.endswith(suffix):
-                function(arguments=(virtual_env, appli, value))
-                appli_env_vars.pop(envvar)
-
-
-def _read_prepend(virtual_env, appli_env_vars, appli):
-    for var_path in ["LD_LIBRARY_PATH", "PYTHONPATH", "PATH"]:
-        for envvar, value in appli_env_vars.copy().items():
-            if envvar.endswith(var_path):
-                for var in reversed(value.split(":")):
-                    if var:
-                        prepend_path(arguments=(virtual_env, appli, f"{var_path} {var}"))
-                appli_env_vars.pop(envvar)
-
-
-def _read_others(virtual_env, appli_env_vars, appli):
-    for suffix, function in {
-                "EXPORTS": setenv,
-                "ALIASES": set_aliases,
-                "REMOVE_PATHS": remove_path}.items():
-        for envvar, value in appli_env_vars.copy().items():
-            if envvar.endswith(suffix):
-                for var in value.split():
-                    if var:
-                        function(arguments=(virtual_env, appli, var.replace("=", " ")))
-                appli_env_vars.pop(envvar)
+    # Handlers are ordered: source files first, then modules, prepend and others
+    lines = []
+    for suffix, (reader, command) in READ_ENV_HANDLERS.items():
+        if suffix in appli_env_vars:
+            prefix = f"{command} "
+            lines.extend(prefix + arguments
+                         for arguments in reader(suffix, appli_env_vars[suffix]))
+
+    if lines:
+        write_lines(virtual_env=virtual_env, appli=appli, lines=lines)
+
+
+def _read_src_files(_, value: str) -> List[str]:
+    return [var for var in value.split(";") if var]
+
+
+def _read_modules(_, value: str) -> List[str]:
+    return [value]
+
+
+def _read_prepend(suffix: str, value: str) -> List[str]:
+    paths = " ".join(var for var in value.split(":") if var)
+    return [f"{suffix} {paths}"] if paths else []
+
+
+def _read_others(_, value: str) -> List[str]:
+    return [var.replace("=", " ") for var in value.split()]
+
+
+# Suffix -> (reader, command), in processing order
+READ_ENV_HANDLERS = {
+    "SOURCEFILES": (_read_src_files, "source-sh"),
+    "MODULE_USE": (_read_modules, "module use"),
+    "MODULEFILES": (_read_modules, "module load"),
+    "LD_LIBRARY_PATH": (_read_prepend, "prepend-path"),
+    "PYTHONPATH": (_read_prepend, "prepend-path"),
+    "PATH": (_read_prepend, "prepend-path"),
+    "EXPORTS": (_read_others, "setenv"),
+    "ALIASES": (_read_others, "set-alias"),
+    "REMOVE_PATHS": (_read_others, "remove-path"),
+}
@@ -1,13 +1,14 @@
 """Commands to create a modulefile."""
 
+from itertools import chain
 from pathlib import Path
 from typing import List
 
 from ..tools import get_std_name
 from . import get_parser
-from .append_module import module_load, read_env as read_env_vars
+from .append_module import write_commands, read_env as read_env_vars
 from ..modulefile import (ModuleInstaller, upgrade_modulefile, create_modulefile,
-                          upgrade_venv, test_if_already_init)
+                          get_module_file_directory, upgrade_venv, test_if_already_init)
 
 from ..tools import PACKAGE_NAME, check_raise, remove_duplicates
 
@@ -44,7 +45,7 @@ def initialize(virtual_env: Path = None,
                       " It can be a source directory to avoid downloading"),
                      ("activate-log", "", "Log message when the module is loaded."),
                      ("read-env", False, "Read environment variables. 'See cmd-read-env'")])
-        virtual_env = Path(options.virtual_env).absolute()
+        virtual_env = options.virtual_env
         if options.modulefile_version:
             version_or_path = options.modulefile_version
         read_env = options.read_env
@@ -102,26 +103,35 @@ def add_appli(virtual_env: Path = None,
                                  ("disconnect", False,
                                   "Disconnects applis loading at activate.")
                              ])
-        virtual_env = Path(options.virtual_env).absolute()
+        virtual_env = options.virtual_env
         virtual_env_name = get_std_name(virtual_env.name)
         read_env = options.read_env
         disconnect = options.disconnect
     else:
         virtual_env_name = virtual_env.name
 
+    module_directory = get_module_file_directory(virtual_env=virtual_env)
+    module_directory.mkdir(parents=True, exist_ok=True)
+
     fails = []
-    for appli in remove_duplicates(options.APPLI + (applis if applis else [])):
+    modules_to_load = []
+    for appli in remove_duplicates(chain(options.APPLI, applis or ())):
         appli_name = get_std_name(appli)
         module_name = f"{virtual_env_name}-{appli_name}"
         if create_modulefile(virtual_env=virtual_env,
                              module_name=module_name,
-                             module_category=f"{PACKAGE_NAME}-{appli_name}"):
+                             module_category=f"{PACKAGE_NAME}-{appli_name}",
+                             module_directory=module_directory):
             fails.append(appli)
 
         if read_env:
             read_env_vars(arguments=(virtual_env, appli_name))
         if not disconnect:
-            module_load(arguments=(virtual_env, "", module_name))
+            modules_to_load.append(module_name)
+
+    if modules_to_load:
+        write_commands(virtual_env=virtual_env, appli="",
+                       command="module load", arguments_list=modules_to_load)
 
     check_raise(condition=len(fails) > 0,
                 exception_type=RuntimeError,
@@ -1,48 +1,74 @@
 """Tests import of Pyhton packages."""
 import importlib
-from typing import List
+import importlib.util
+import sys
+from typing import List, Tuple
 
 from ..tools import remove_duplicates
 from . import get_parser
 
 
-def _test_module_import(module_name: str, verbose: bool) -> str:
-    """Test module import.
+def _import_module(module_name: str, locate_only: bool) -> Tuple[str, ImportError]:
+    """Import, or only locate, a module.
 
     Parameters
     ----------
     module_name : str
         Name of the module to test.
-    verbose : bool
-        True to print result.
+    locate_only : bool
+        True to only locate the module with ``find_spec``, without importing (executing) it.
 
     Returns
     -------
-    str
-        Import error description if any. Else None.
+    Tuple[str, ImportError]
+        Module location (None if failed) and import error if any (else None).
     """
+    if not locate_only:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as err:
+            return None, err
+        return getattr(module, "__file__", None) or module.__name__, None
 
-    error = None
     try:
-        module = importlib.import_module(module_name)
+        spec = importlib.util.find_spec(module_name)
     except ImportError as err:
-        error = err
+        return None, err
+    except ValueError:  # already imported module without __spec__
+        module = sys.modules[module_name]
+        return getattr(module, "__file__", None) or module.__name__, None
+    if spec is None:
+        return None, ModuleNotFoundError(f"No module named '{module_name}'")
+    return spec.origin if spec.has_location else spec.name, None
 
-    if verbose:
-        print(f">>> import {module_name}:")
-        if error:
-            print(f"  FAILED {error}")
-        else:
-            if hasattr(module, "__file__"):
-                print(f"  {module.__file__}")
-            elif hasattr(module, "__name__"):
-                print(f"  {module.__name__}")
-    return error
+
+def _print_module_import(module_name: str, location: str, error: ImportError):
+    """Print a module import result.
+
+    Parameters
+    ----------
+    module_name : str
+        Name of the tested module.
+    location : str
+        File of the module, or its name if not file based.
+    error : ImportError
+        Import error if any.
+    """
+    print(f">>> import {module_name}:")
+    if error:
+        print(f"  FAILED {error}")
+    else:
+        print(f"  {location}")
 
 
 def test_imports(arguments: List[str] = None) -> int:
     """Test import modules
 
+    Modules are imported, which also checks their dependencies, e.g. the shared libraries of
+    extension modules. With ``--locate-only`` they are only located
+    (``importlib.util.find_spec``). Imports run on the main thread: modules may have main-thread
+    only side effects, e.g. ``signal.signal``.
+
     Parameters
     ----------
     arguments : List[str], optional
@@ -56,17 +82,21 @@ def test_imports(arguments: List[str] = None) -> int:
     if arguments is None:
         options = get_parser(description="Test module import.",
                              positionals=[("MODULE", [], "List of Python modules to test.", '+')],
-                             with_appli=False)
+                             with_appli=False,
+                             options=[("locate-only", False,
+                                       "Only locate the modules, without importing them:"
+                                       " their dependencies are not checked.")])
         arguments = options.MODULE
 
     if options.verbose:
         print("Testing env :")
 
     failed = {}
-
-    for module in remove_duplicates(arguments):
-        error = _test_module_import(module, options.verbose)
+    for module_name in remove_duplicates(arguments):
+        location, error = _import_module(module_name, options.locate_only)
+        if options.verbose:
+            _print_module_import(module_name, location, error)
         if error:
-            failed[module] = error
+            failed[module_name] = error
 
     return len(failed)
@@ -1,17 +1,18 @@
 """Environment module modification/installation."""
 
 import os
+import re
 import shutil
 from pathlib import Path
-import pathlib
 import subprocess
+import sys
 import tarfile
 
 import inspect
 from packaging import version
 import requests
 
-from venvmod.tools import (get_std_name, get_shell_command, check_raise,
+from venvmod.tools import (get_std_name, check_raise,
                            get_shell_name, PACKAGE_NAME)
 
 
@@ -34,6 +35,8 @@ def get_module_file_directory(virtual_env: Path) -> Path:
 ACTIVATE_HEADER_LINE = (f"# This file is generated from {PACKAGE_NAME}"
                         " from regular venv or virtualenv file.")
 
+ACTIVATE_HEADER_SEARCH_SIZE = 4096
+
 
 def test_if_already_init(virtual_env: Path):
     """checks if venv-modulefile is already initialized.
@@ -43,9 +46,21 @@ def test_if_already_init(virtual_env: Path):
     virtual_env : Path
         Path to virtual env
     """
+    # ``upgrade_venv`` writes the header as the third line, after the two first lines of the
+    # venv/virtualenv script: only the beginning of the file is read. The window leaves a margin
+    # for long first lines, which are not written by venvmod, and is read in a single block.
     with (virtual_env / "bin" / "activate").open(mode="r", encoding='utf-8') as src_file:
-        check_raise(ACTIVATE_HEADER_LINE in src_file.read(), AssertionError,
-                    f"{virtual_env} is already a venv-modulefile environment.")
+        _check_activate_head(virtual_env, src_file.read(ACTIVATE_HEADER_SEARCH_SIZE))
+
+
+def _check_activate_head(virtual_env: Path, activate_head: str):
+    """raises if the beginning of the activate script holds the venv-modulefile header."""
+    check_raise(ACTIVATE_HEADER_LINE in activate_head,
+                AssertionError,
+                f"{virtual_env} is already a venv-modulefile environment.")
+
+
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
 
 
 class ModuleInstaller:  # pylint: disable=too-few-public-methods
@@ -61,6 +76,31 @@ class ModuleInstaller:  # pylint: disable=too-few-public-methods
         self._install_prefix: Path = Path(install_prefix)
         self._cache_directory: Path = Path(cache_directory)
 
+    def _download(self) -> Path:
+        """Downloads the Environment Module tarball in the cache directory if not already there.
+
+        Returns
+        -------
+        Path
+            Path to the cached tarball
+        """
+        tar_file = self._cache_directory / f"modules-{self._version_or_path}.tar.gz"
+        if tar_file.exists():
+            return tar_file
+
+        partial_file = tar_file.with_name(f"{tar_file.name}.part")
+        with requests.get(url="https://github.com/cea-hpc/modules/releases/download/"
+                              f"v{self._version_or_path}/"
+                              f"modules-{self._version_or_path}.tar.gz",
+                          stream=True,
+                          timeout=120.0) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with partial_file.open("wb") as cache_file:
+                shutil.copyfileobj(response.raw, cache_file, length=DOWNLOAD_BUFFER_SIZE)
+        os.replace(partial_file, tar_file)
+        return tar_file
+
     def run(self, verbose: bool = False):
         """run installer
 
@@ -72,6 +112,8 @@ class ModuleInstaller:  # pylint: disable=too-few-public-methods
 
         self._cache_directory.mkdir(parents=True, exist_ok=True)
         if Path(self._version_or_path).exists():
+            # a user source directory may hold a previous build
+            clean = True
             build_directory = self._cache_directory / Path(self._version_or_path).name
             shutil.copytree(Path(self._version_or_path), build_directory, symlinks=True)
         else:
@@ -81,44 +123,44 @@ class ModuleInstaller:  # pylint: disable=too-few-public-methods
                                 f" found {self._version_or_path}."
                         )
             build_directory = self._cache_directory / f"modules-{self._version_or_path}"
-            if not build_directory.exists():
-                cwd = os.getcwd()
-                os.chdir(self._cache_directory)
-                try:
-                    tar_file = (Path(__file__).parent.absolute().resolve() /
-                                "modulefiles_src" / f"modules-{self._version_or_path}.tar.gz")
-                    if tar_file.exists():
-                        file = tarfile.open(  # pylint: disable=consider-using-with
-                            tar_file,
-                            mode="r|gz")
+            # a build directory left by a previous run (failed build, moved venv) is cleaned
+            clean = build_directory.exists()
+            if not clean:
+                tar_file = (Path(__file__).parent.absolute().resolve() /
+                            "modulefiles_src" / f"modules-{self._version_or_path}.tar.gz")
+                if not tar_file.exists():
+                    tar_file = self._download()
+                with tarfile.open(tar_file, mode="r:gz") as file:
+                    if 'filter' in inspect.signature(file.extractall).parameters:
+                        file.extractall(path=self._cache_directory.absolute(), filter='tar')
                     else:
-                        file = tarfile.open(  # pylint: disable=consider-using-with
-                            fileobj=requests.get(
-                                url="https://github.com/cea-hpc/modules/releases/download/"
-                                    f"v{self._version_or_path}/"
-                                    f"modules-{self._version_or_path}.tar.gz",
-                                stream=True,
-                                timeout=120.0).raw,
-                            mode="r|gz")
-                    try:
-                        if 'filter' in inspect.signature(file.extractall).parameters:
-                            file.extractall(filter='tar')
-                        else:
-                            file.extractall()
-                    finally:
-                        file.close()
-                finally:
-                    os.chdir(cwd)
+                        file.extractall(path=self._cache_directory.absolute())
 
         pipe = subprocess.PIPE if not verbose else None
-        for command in [[f"{build_directory}/configure",
-                         f"--prefix={self._install_prefix}",
-                         "--with-python=$(which python3)"],
-                        ["make", "clean"],
-                        ["make"],
-                        ["make", "install"]]:
-            subprocess.run([get_shell_command(), "-c", " ".join(command)],
-                           stderr=pipe, stdout=pipe, cwd=build_directory, check=True)
+        commands = [[f"{build_directory}/configure",
+                     f"--prefix={self._install_prefix}",
+                     f"--with-python={shutil.which('python3') or sys.executable}"]]
+        if clean:
+            commands.append(["make", "clean"])
+        commands.append(["make", f"-j{os.cpu_count() or 1}", "install"])
+        for command in commands:
+            subprocess.run(command, stderr=pipe, stdout=pipe, cwd=build_directory, check=True)
+
+
+def _replace_activate(activate_src: Path, content: str):
+    """Replaces the content of an activate script with an atomic rename.
+
+    Parameters
+    ----------
+    activate_src : Path
+        Path to the activate script
+    content : str
+        New content
+    """
+    activate_tmp = activate_src.with_name(f"{activate_src.name}.{PACKAGE_NAME}.tmp")
+    activate_tmp.write_text(content, encoding='utf-8')
+    shutil.copymode(activate_src, activate_tmp)
+    os.replace(activate_tmp, activate_src)
 
 
 def upgrade_modulefile(virtual_env: Path, module_prefix: Path):
@@ -136,26 +178,20 @@ def upgrade_modulefile(virtual_env: Path, module_prefix: Path):
     check_raise(not activate_src.is_file(), AssertionError,
                 f'"activate" file {activate_src} not found.')
 
-    with open(activate_src, "r", encoding='utf-8') as src_file:
-        src_lines = src_file.readlines()
-
-    tmp_path = virtual_env / "tmp" / PACKAGE_NAME
-    tmp_path.mkdir(parents=True, exist_ok=True)
-
-    activate_tmp = tmp_path / "activate"
-
     init_file_path = module_prefix / "init"
 
     init_file = init_file_path / get_shell_name()
     check_raise(not os.path.isfile(init_file), AssertionError,
                 f'Environment Module "init" file {init_file} not found.')
 
-    with open(activate_tmp, "w", encoding='utf-8') as tmp_file:
-        for line in src_lines:
-            tmp_file.write(line)
+    init_line = "\n"f". {init_file_path}{os.sep}$(ps -ocomm= -q $$)\n"
+    out_lines = []
+    with activate_src.open("r", encoding='utf-8') as src_file:
+        for line in src_file:
+            out_lines.append(line)
             if "you cannot run it directly" in line:
-                tmp_file.write("\n"f". {init_file_path}{os.sep}$(ps -ocomm= -q $$)\n")
-    pathlib.Path.replace(activate_tmp, activate_src)
+                out_lines.append(init_line)
+    _replace_activate(activate_src, "".join(out_lines))
 
 
 MODULE_TEMPLATES = {"TCL": """#%Module -*- tcl -*-
@@ -179,43 +215,48 @@ conflict $category
 
 """}
 
+MODULE_TEMPLATE_FIELDS = re.compile(r"__(name|category|log_load)__")
+
+TCL_BRACKETS_ESCAPE = str.maketrans({'[': r'\[', ']': r'\]'})
+
 
 def create_modulefile(virtual_env: Path,
                       module_name: str = PACKAGE_NAME,
                       module_category: str = None,
-                      log_load: str = ""):
+                      log_load: str = "",
+                      module_directory: Path = None):
     """Creates a modulefile.
 
     Parameters
     ----------
+    virtual_env : Path
+        Path to virtual env
     module_name : str
         Name of the module to create
-    module_directory : Path
-        Module directory
     module_category : str, optional
         Module category, by default None
     log_load : str, optional
         Loag edited at load, by default ""
+    module_directory : Path, optional
+        Existing module directory, by default None to create the one of ``virtual_env``
     """
 
-    module_directory = get_module_file_directory(virtual_env=virtual_env)
-    module_directory.mkdir(parents=True, exist_ok=True)
+    if module_directory is None:
+        module_directory = get_module_file_directory(virtual_env=virtual_env)
+        module_directory.mkdir(parents=True, exist_ok=True)
 
     module_file_name = module_directory / module_name
 
-    module_file = MODULE_TEMPLATES["TCL"].replace("__name__", module_name)
-    module_file = module_file.replace("__category__", module_category)
-
     to_replace = ""
     if log_load:
-        log_load = log_load.replace('[', r'\[').replace(']', r'\]')
         to_replace = ('if { [ module-info mode load ] } {\n'
-                      f'    puts stderr "{log_load}"\n'
+                      f'    puts stderr "{log_load.translate(TCL_BRACKETS_ESCAPE)}"\n'
                       '}')
-    module_file = module_file.replace("__log_load__", to_replace)
+    fields = {"name": module_name, "category": module_category, "log_load": to_replace}
 
-    with open(module_file_name, "w", encoding='utf-8') as mod_file:
-        mod_file.write(module_file)
+    module_file_name.write_text(
+        MODULE_TEMPLATE_FIELDS.sub(lambda match: fields[match.group(1)], MODULE_TEMPLATES["TCL"]),
+        encoding='utf-8')
 
 
 SHELL_TEST_DEACTIVATE_STATUS = """
@@ -262,6 +303,19 @@ _test_activate_status
 """
 
 
+ACTIVATE_MARKERS = re.compile(r"(?P<deactivate_def>deactivate \(\) \{)|"
+                              r"(?P<unset_deactivate>unset -f deactivate)|"
+                              r"(?P<unset_virtual_env>^\s*unset\s+VIRTUAL_ENV\s*$)|"
+                              r"(?P<deactivate_nondestructive>deactivate nondestructive)")
+
+# marker -> (0: insert before / 1: insert after the line, text to insert), for the markers that
+# do not depend on the virtual env
+ACTIVATE_INSERTIONS = {
+    "deactivate_def": (0, SHELL_TEST_DEACTIVATE_STATUS),
+    "unset_deactivate": (1, "        _test_deactivate_status\n        return $?\n"),
+}
+
+
 def upgrade_venv(virtual_env: Path):
     """Ugrade virtual env with modulefile at activate and deactivate.
 
@@ -285,36 +339,25 @@ def upgrade_venv(virtual_env: Path):
     modulefile_name = get_std_name(virtual_env.name)
     module_directory = get_module_file_directory(virtual_env=virtual_env)
 
-    test_if_already_init(virtual_env=virtual_env)
-
-    with open(activate_src, "r", encoding='utf-8') as src_file:
-        src_lines = src_file.readlines()
+    activate_text = activate_src.read_text(encoding='utf-8')
+    _check_activate_head(virtual_env, activate_text[:ACTIVATE_HEADER_SEARCH_SIZE])
 
-    tmp_path = virtual_env / "tmp" / PACKAGE_NAME
-    tmp_path.mkdir(exist_ok=True, parents=True)
+    insertions = {
+        **ACTIVATE_INSERTIONS,
+        "unset_virtual_env": (1, UNLOAD_MODULES.format(modulefile_name, str(module_directory))),
+        "deactivate_nondestructive": (1, LOAD_MODULES.format(str(module_directory),
+                                                             modulefile_name)),
+    }
 
-    activate_tmp = tmp_path / "activate"
-
-    with activate_tmp.open("w", encoding='utf-8') as tmp_file:
-
-        for count, line in enumerate(src_lines):
-            to_write = ()
-            if count == 2:
-                to_write = (0, f"{ACTIVATE_HEADER_LINE}\n")
-            elif "deactivate () {" in line:
-                to_write = (0, SHELL_TEST_DEACTIVATE_STATUS)
-            elif "unset -f deactivate" in line:
-                to_write = (1, "        _test_deactivate_status\n        return $?\n")
-            elif line.split() == ["unset", "VIRTUAL_ENV"]:
-                to_write = (1, UNLOAD_MODULES.format(modulefile_name, str(module_directory)))
-            elif "deactivate nondestructive" in line:
-                to_write = (1, LOAD_MODULES.format(str(module_directory), modulefile_name))
-            else:
-                to_write = (0, "")
-
-            tmp_file.write(line + to_write[1] if to_write[0] else to_write[1] + line)
+    out_lines = []
+    for count, line in enumerate(activate_text.splitlines(keepends=True)):
+        if count == 2:
+            to_write = (0, f"{ACTIVATE_HEADER_LINE}\n")
+        else:
+            marker = ACTIVATE_MARKERS.search(line)
+            to_write = insertions[marker.lastgroup] if marker else (0, "")
 
-        tmp_file.write(SHELL_TEST_ACTIVATE_STATUS)
+        out_lines.append(line + to_write[1] if to_write[0] else to_write[1] + line)
 
-    shutil.copyfile(activate_tmp, activate_src)
-    shutil.rmtree(tmp_path)
+    out_lines.append(SHELL_TEST_ACTIVATE_STATUS)
+    _replace_activate(activate_src, "".join(out_lines))
@@ -1,7 +1,8 @@
 """Regroups tool for the package.
 """
 import logging
-from typing import List
+from functools import lru_cache
+from typing import Iterable, List, Tuple
 
 import shellingham
 
@@ -32,6 +33,18 @@ def check_raise(condition: bool, exception_type: Exception, message: str):
         raise exception_type(message)
 
 
+@lru_cache(maxsize=1)
+def _detect_shell() -> Tuple[str, str]:
+    """Detects the current shell once per process.
+
+    Returns
+    -------
+    Tuple[str, str]
+        shell name and shell command
+    """
+    return shellingham.detect_shell()
+
+
 def get_shell_name() -> str:
     """Gets current shell name.
 
@@ -40,7 +53,7 @@ def get_shell_name() -> str:
     str
         shell name
     """
-    return shellingham.detect_shell()[0]
+    return _detect_shell()[0]
 
 
 def get_shell_command() -> str:
@@ -51,23 +64,31 @@ def get_shell_command() -> str:
     str
         shell command
     """
-    return shellingham.detect_shell()[1]
+    return _detect_shell()[1]
 
 
-def remove_duplicates(input_list: List) -> List:
-    """Removes duplicate values in a list.
+def remove_duplicates(input_list: Iterable) -> List:
+    """Removes duplicate values in a list, keeping the first occurrence order.
 
     Parameters
     ----------
-    input_list : List
-        Input list.
+    input_list : Iterable
+        Input values.
 
     Returns
     -------
     List
         Output list.
     """
-    return [value for index, value in enumerate(input_list) if value not in input_list[index+1:]]
+    values = list(input_list)
+    try:
+        return list(dict.fromkeys(values))
+    except TypeError:  # unhashable values
+        unique = []
+        for value in values:
+            if value not in unique:
+                unique.append(value)
+        return unique
 
 
 def get_std_name(name: str) -> str:
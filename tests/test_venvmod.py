@@ -1,17 +1,81 @@
-"""Test ``venvmod`` package"""
+"""Test ``venvmod`` package
 
+Tests share the modulefiles of the ``VIRTUAL_ENV`` virtual environment, cleaned and initialized
+once per session: they form the serial ``venv`` group of pytest-xdist, to be run with
+``-n auto --dist loadgroup``.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
 import os
 from pathlib import Path
 import shutil
 import subprocess
-from typing import Dict, List
+import sys
+import traceback
+from types import ModuleType
+from typing import Dict, List, Tuple
+from unittest import mock
+
+import pytest
+
+try:
+    from importlib.metadata import distribution
+except ImportError:  # Python < 3.8
+    from importlib_metadata import distribution
+
+
+from venvmod.commands import get_module_filepath
+from venvmod.modulefile import ModuleInstaller
+from venvmod.tools import get_shell_command, remove_duplicates
+
+
+pytestmark = pytest.mark.xdist_group("venv")
+
+# Console scripts are called in the test process: it avoids an interpreter start-up per command.
+CMD_TABLE = {entry_point.name: entry_point.load()
+             for entry_point in distribution("venv-modulefile").entry_points
+             if entry_point.group == "console_scripts" and entry_point.name.startswith("venvmod-")}
 
 
-from venvmod.tools import get_shell_command
+def run_venvmod_cmd(args: List[str], env: Dict[str, str] = None) -> subprocess.CompletedProcess:
+    """Runs a ``venvmod`` console script in the test process.
+
+    Parameters
+    ----------
+    args : List[str]
+        Argument list, starting with the console script name
+    env : Dict[str, str]
+        Environment to use during the command, default = None
+
+    Returns
+    -------
+    subprocess.CompletedProcess
+        Command result, as returned by ``subprocess.run``
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = args
+    try:
+        with mock.patch.dict(os.environ, env or {}), \
+                redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                returncode = CMD_TABLE[args[0]]() or 0
+            except SystemExit as error:
+                returncode = error.code if isinstance(error.code, int) else int(bool(error.code))
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                returncode = 1
+    finally:
+        sys.argv = saved_argv
+
+    return subprocess.CompletedProcess(args=args, returncode=returncode,
+                                       stdout=stdout.getvalue().encode(),
+                                       stderr=stderr.getvalue().encode())
 
 
 def get_results(result: subprocess.CompletedProcess, xfail: bool = False) -> bool:
-    """Gets result informations.
+    """Gets result informations, printed on failure or if ``VENVMOD_DEBUG`` is set.
 
     Parameters
     ----------
@@ -26,9 +90,13 @@ def get_results(result: subprocess.CompletedProcess, xfail: bool = False) -> boo
         True if success
     """
     success = (result.returncode != 0) if xfail else (result.returncode == 0)
+    if success and not os.environ.get("VENVMOD_DEBUG"):
+        return success
+
     print(('\033[92m' if success else '\033[91m') + f"cmd: '{result.args[0]}' xfail: '{xfail}'")
     for out_typ, content in {'stderr': result.stderr, 'stdout': result.stdout}.items():
-        print(f"{out_typ}: {content.decode()}")
+        if content:
+            print(f"{out_typ}: {content.decode()}")
     print('\033[0m')
     return success
 
@@ -45,10 +113,10 @@ def venvmod_cmd(args: List[str], xfail: bool, err_msg: str = None, env: Dict[str
     err_msg : str, optional
         Error message to check, default = None
     env : Dict[str, str]
-        Environment to pass to subprocess, default = None
+        Environment variables set during the command, default = None
     """
-    result = subprocess.run(args=args + ["--verbose"],  # pylint: disable=subprocess-run-check
-                            stderr=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+    args = [str(arg) for arg in args] + (["--verbose"] if os.environ.get("VENVMOD_DEBUG") else [])
+    result = run_venvmod_cmd(args=args, env=env)
     success = get_results(result=result, xfail=xfail)
 
     if err_msg:
@@ -57,93 +125,74 @@ def venvmod_cmd(args: List[str], xfail: bool, err_msg: str = None, env: Dict[str
     assert success
 
 
-def all_venvmod_commands(venv_path: Path, test_scripts: List, appli: str = None):
-    """Tests all cli venvmod commands.
+APPLI_NAME = "Ap-p_Li.1"
+
+# (command, arguments, xfail, err_msg) run on the venv modulefile then on the appli one.
+# '{modulefiles}' is replaced by the venv modulefiles directory holding the test scripts.
+VENVMOD_CASES = [
+    ("venvmod-cmd-module-use", [], True, "the following arguments are required: PATH"),
+    ("venvmod-cmd-module-use", ["/path/to/toto"], False, None),
+    ("venvmod-cmd-module-use", ["/path/to/toto1", "/path/to/toto2"], False, None),
+
+    ("venvmod-cmd-module-load", [], True, "the following arguments are required: MODULE"),
+    ("venvmod-cmd-module-load", ["test_module"], False, None),
+    ("venvmod-cmd-module-load", ["test_module1", "test_module2"], False, None),
+
+    ("venvmod-cmd-source-sh", [], True, "the following arguments are required: SHELL, SCRIPT"),
+    ("venvmod-cmd-source-sh", ["bash"], True, "the following arguments are required: SCRIPT"),
+    ("venvmod-cmd-source-sh", ["bash", "{modulefiles}/test_script"], False, None),
+    ("venvmod-cmd-source-sh", ["bash", "{modulefiles}/test_script1", "arg"], False, None),
+    ("venvmod-cmd-source-sh", ["bash", "{modulefiles}/test_script2", "arg1", "arg2"],
+     False, None),
+
+    ("venvmod-cmd-prepend-path", [], True, "the following arguments are required: ENV_VAR, PATH"),
+    ("venvmod-cmd-prepend-path", ["PATH"], True, "the following arguments are required: PATH"),
+    ("venvmod-cmd-prepend-path", ["PATH", "value"], False, None),
+    ("venvmod-cmd-prepend-path", ["PATH", "value1", "value2"], False, None),
+
+    ("venvmod-cmd-append-path", [], True, "the following arguments are required: ENV_VAR, PATH"),
+    ("venvmod-cmd-append-path", ["PATH"], True, "the following arguments are required: PATH"),
+    ("venvmod-cmd-append-path", ["PATH", "value"], False, None),
+    ("venvmod-cmd-append-path", ["PATH", "value1", "value2"], False, None),
+
+    ("venvmod-cmd-setenv", [], True, "the following arguments are required: VARIABLE, VALUE"),
+    ("venvmod-cmd-setenv", ["TEST_VAR"], True, "the following arguments are required: VALUE"),
+    ("venvmod-cmd-setenv", ["TEST_VAR", "test_value"], False, None),
+    ("venvmod-cmd-setenv", ["TEST_VAR2", "test_value1", "test_value2"],
+     True, "unrecognized arguments: test_value2"),
+
+    ("venvmod-cmd-remove-path", [], True, "the following arguments are required: VARIABLE, PATH"),
+    ("venvmod-cmd-remove-path", ["TEST_PATH"], True, "the following arguments are required: PATH"),
+    ("venvmod-cmd-remove-path", ["TEST_PATH", "test_path"], False, None),
+    ("venvmod-cmd-remove-path", ["TEST_PATH2", "test_path1", "test_path2"],
+     True, "unrecognized arguments: test_path2"),
+
+    ("venvmod-cmd-set-alias", [], True, "the following arguments are required: ALIAS, VALUE"),
+    ("venvmod-cmd-set-alias", ["test_cmd"], True, "the following arguments are required: VALUE"),
+    ("venvmod-cmd-set-alias", ["test_cmd", "cmd1"], False, None),
+    ("venvmod-cmd-set-alias", ["test_cmd", "cmd1", "cmd2"], True, "unrecognized arguments: cmd2"),
+]
+
+
+def venvmod_case_cmd(venv_path: Path, case: Tuple, appli: str = None):
+    """Executes a ``VENVMOD_CASES`` command.
 
     Parameters
     ----------
     venv_path : Path
         venv directory
+    case : Tuple
+        (command, arguments, xfail, err_msg) case
     appli : str, optional
         appli name if any, by default None
     """
-
-    appli = ["--appli", appli] if appli else []
-
-    venv_pathname = str(venv_path)
-
-    venvmod_cmd(args=["venvmod-cmd-module-use", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: PATH")
-    venvmod_cmd(args=["venvmod-cmd-module-use", venv_pathname,
-                      "/path/to/toto"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-module-use", venv_pathname,
-                      "/path/to/toto1", "/path/to/toto2"] + appli, xfail=False)
-
-    venvmod_cmd(args=["venvmod-cmd-module-load", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: MODULE")
-    venvmod_cmd(args=["venvmod-cmd-module-load", venv_pathname,
-                      "test_module"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-module-load", venv_pathname,
-                      "test_module1", "test_module2"] + appli, xfail=False)
-
-    venvmod_cmd(args=["venvmod-cmd-source-sh", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: SHELL, SCRIPT")
-    venvmod_cmd(args=["venvmod-cmd-source-sh", venv_pathname, "bash"] + appli,
-                xfail=True, err_msg="the following arguments are required: SCRIPT")
-    venvmod_cmd(args=["venvmod-cmd-source-sh", venv_pathname,
-                      "bash", f"{test_scripts[0]}"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-source-sh", venv_pathname,
-                      "bash", f"{test_scripts[1]}", "arg"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-source-sh", venv_pathname,
-                      "bash", f"{test_scripts[2]}", "arg1", "arg2"] + appli, xfail=False)
-
-    venvmod_cmd(args=["venvmod-cmd-prepend-path", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: ENV_VAR, PATH")
-    venvmod_cmd(args=["venvmod-cmd-prepend-path", venv_pathname, "PATH"] + appli,
-                xfail=True, err_msg="the following arguments are required: PATH")
-    venvmod_cmd(args=["venvmod-cmd-prepend-path", venv_pathname,
-                      "PATH", "value"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-prepend-path", venv_pathname,
-                      "PATH", "value1", "value2"] + appli, xfail=False)
-
-    venvmod_cmd(args=["venvmod-cmd-append-path", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: ENV_VAR, PATH")
-    venvmod_cmd(args=["venvmod-cmd-append-path", venv_pathname, "PATH"] + appli,
-                xfail=True, err_msg="the following arguments are required: PATH")
-    venvmod_cmd(args=["venvmod-cmd-append-path", venv_pathname,
-                      "PATH", "value"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-append-path", venv_pathname,
-                      "PATH", "value1", "value2"] + appli, xfail=False)
-
-    venvmod_cmd(args=["venvmod-cmd-setenv", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: VARIABLE, VALUE")
-    venvmod_cmd(args=["venvmod-cmd-setenv", venv_pathname, "TEST_VAR"] + appli,
-                xfail=True, err_msg="the following arguments are required: VALUE")
-    venvmod_cmd(args=["venvmod-cmd-setenv", venv_pathname,
-                      "TEST_VAR", "test_value"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-setenv", venv_pathname,
-                      "TEST_VAR2", "test_value1", "test_value2"] + appli,
-                xfail=True, err_msg="unrecognized arguments: test_value2")
-
-    venvmod_cmd(args=["venvmod-cmd-remove-path", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: VARIABLE, PATH")
-    venvmod_cmd(args=["venvmod-cmd-remove-path", venv_pathname, "TEST_PATH"] + appli,
-                xfail=True, err_msg="the following arguments are required: PATH")
-    venvmod_cmd(args=["venvmod-cmd-remove-path", venv_pathname,
-                      "TEST_PATH", "test_path"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-remove-path", venv_pathname,
-                      "TEST_PATH2", "test_path1", "test_path2"] + appli,
-                xfail=True, err_msg="unrecognized arguments: test_path2")
-
-    venvmod_cmd(args=["venvmod-cmd-set-alias", venv_pathname] + appli,
-                xfail=True, err_msg="the following arguments are required: ALIAS, VALUE")
-    venvmod_cmd(args=["venvmod-cmd-set-alias", venv_pathname, "test_cmd"] + appli,
-                xfail=True, err_msg="the following arguments are required: VALUE")
-    venvmod_cmd(args=["venvmod-cmd-set-alias", venv_pathname,
-                      "test_cmd", "cmd1"] + appli, xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-set-alias", venv_pathname,
-                      "test_cmd", "cmd1", "cmd2"] + appli,
-                xfail=True, err_msg="unrecognized arguments: cmd2")
+    command, arguments, xfail, err_msg = case
+    modulefiles = venv_path / "etc" / "modulefiles"
+    appli_args = ("--appli", appli) if appli else ()
+    venvmod_cmd(args=[command, str(venv_path),
+                      *(argument.format(modulefiles=modulefiles) for argument in arguments),
+                      *appli_args],
+                xfail=xfail, err_msg=err_msg)
 
 
 def check_venv() -> Path:
@@ -172,15 +221,84 @@ def check_venv() -> Path:
         shutil.copyfile(src=venv_path / "bin" / "activate",
                         dst=venv_path / "bin" / "_activate")
 
-    for subdir in ["etc", "opt", ".cache"]:
-        if (venv_path / subdir).exists():
-            shutil.rmtree(venv_path / subdir)
+    with os.scandir(venv_path) as entries:
+        for entry in entries:
+            if entry.name in ("etc", "opt", ".cache") and entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
 
     return venv_path
 
 
-def test_venvmod_cmds():
-    """Tests all commands."""
+def get_test_scripts(venv_path: Path) -> List[Path]:
+    """Gets the test scripts written in the virtual environment.
+
+    Parameters
+    ----------
+    venv_path : Path
+        venv directory
+
+    Returns
+    -------
+    List[Path]
+        Test script paths
+    """
+    return [venv_path / "etc" / "modulefiles" / test_script
+            for test_script in ["test_script", "test_script1", "test_script2"]]
+
+
+def get_env_prefix(name: str) -> str:
+    """Gets the environment variable prefix read by ``--read-env`` for a venv or appli name.
+
+    Parameters
+    ----------
+    name : str
+        venv or appli name
+
+    Returns
+    -------
+    str
+        Environment variable prefix
+    """
+    return name.upper().replace("-", "_").replace(".", "_")
+
+
+def create_subenv(prefix: str, test_scripts: List[Path]) -> Dict[str, str]:
+    """Creates the variables read by ``--read-env``, set on top of the current environment.
+
+    Parameters
+    ----------
+    prefix : str
+        Environment variable prefix
+    test_scripts : List[Path]
+        Test script paths
+
+    Returns
+    -------
+    Dict[str, str]
+        Environment variables
+    """
+    return {
+        f"{prefix}_LD_LIBRARY_PATH": "/path/to/lib1:/path/to/lib2",
+        f"{prefix}_PYTHONPATH": "/path/to/packages1:/path/to/packages2",
+        f"{prefix}_PATH": "/path/to/bin1:/path/to/bin2",
+        f"{prefix}_MODULE_USE": "/path/to/modules1 /path/to/modules2",
+        f"{prefix}_MODULEFILES": "test_module1 test_module2",
+        f"{prefix}_SOURCEFILES": f"bash {test_scripts[0]} arg1 arg2; bash {test_scripts[1]}",
+        f"{prefix}_EXPORTS": "VAR1=value1 VAR2=value2",
+        f"{prefix}_ALIASES": "alias-1='cmd1' alias-2='cmd2'",
+        f"{prefix}_REMOVE_PATHS": "PATH1=/obsolete/path",
+    }
+
+
+@pytest.fixture(scope="session", name="initialized_venv")
+def fixture_initialized_venv() -> Path:
+    """Cleans and initializes the virtual environment once for all tests.
+
+    Returns
+    -------
+    Path
+        Path to the virtual environment.
+    """
 
     venv_path = check_venv()
 
@@ -192,90 +310,173 @@ def test_venvmod_cmds():
     venvmod_cmd(args=["venvmod-initialize", "/not/a/dir"], xfail=True)
 
     # Initialize
-    test_scripts = ["test_script", "test_script1", "test_script2"]
-    (venv_path / "etc" / "modulefiles").mkdir(exist_ok=True, parents=True)
-    for index, test_script in enumerate(test_scripts):
-        test_scripts[index] = venv_path / "etc" / "modulefiles" / test_script
-        test_scripts[index].write_text(data="echo $@\n", encoding='utf-8')
-    for test_module in ["test_module", "test_module1", "test_module2"]:
-        (venv_path / "etc" / "modulefiles" / test_module).write_text(
-            data="#%Module -*- tcl -*-\n", encoding='utf-8')
-
-    def create_subenv(prefix: str):
-        sub_env = os.environ.copy()
-        sub_env.update({
-            f"{prefix}_LD_LIBRARY_PATH": "/path/to/lib1:/path/to/lib2",
-            f"{prefix}_PYTHONPATH": "/path/to/packages1:/path/to/packages2",
-            f"{prefix}_PATH": "/path/to/bin1:/path/to/bin2",
-            f"{prefix}_MODULE_USE": "/path/to/modules1 /path/to/modules2",
-            f"{prefix}_MODULEFILES": "test_module1 test_module2",
-            f"{prefix}_SOURCEFILES": f"bash {test_scripts[0]} arg1 arg2; bash {test_scripts[1]}",
-            f"{prefix}_EXPORTS": "VAR1=value1 VAR2=value2",
-            f"{prefix}_ALIASES": "alias-1='cmd1' alias-2='cmd2'",
-            f"{prefix}_REMOVE_PATHS": "PATH1=/obsolete/path",
-            })
-        return sub_env
+    test_scripts = get_test_scripts(venv_path)
+    modulefiles = venv_path / "etc" / "modulefiles"
+    modulefiles.mkdir(exist_ok=True, parents=True)
+    test_files = [(test_script, "echo $@\n") for test_script in test_scripts]
+    test_files += [(modulefiles / test_module, "#%Module -*- tcl -*-\n")
+                   for test_module in ["test_module", "test_module1", "test_module2"]]
+    for test_file, content in test_files:
+        test_file.write_text(data=content, encoding='utf-8')
+
     venvmod_cmd(args=["venvmod-initialize", str(venv_path),
                       "--read-env", "--activate-log", "This is test modulefile."],
                 xfail=False,
-                env=create_subenv(venv_path.name.upper().replace("-", "_").replace(".", "_")))
+                env=create_subenv(get_env_prefix(venv_path.name), test_scripts))
+
+    return venv_path
+
+
+def test_initialize(initialized_venv: Path):
+    """Tests the initialized virtual environment."""
+
+    venv_path = initialized_venv
+
     venvmod_cmd(args=["venvmod-initialize", str(venv_path)],
                 xfail=True, err_msg="is already a venv-modulefile environment.")
 
     assert (venv_path / "etc" / "modulefiles").exists()
     assert (venv_path / "etc" / "modulefiles" / venv_path.name.lower().replace("_", "-")).exists()
 
-    venvmod_cmd(args=["venvmod-cmd-setenv", str(venv_path), "TEST_VAR", "test_value"], xfail=False)
 
-    all_venvmod_commands(venv_path, test_scripts)
+def test_venvmod_cmds(initialized_venv: Path):
+    """Tests a command on the virtual environment modulefile."""
+
+    venvmod_cmd(args=["venvmod-cmd-setenv", str(initialized_venv), "TEST_VAR", "test_value"],
+                xfail=False)
+
+
+@pytest.mark.parametrize("case", VENVMOD_CASES)
+def test_venvmod_cases(initialized_venv: Path, case: Tuple):
+    """Tests all commands on the virtual environment modulefile."""
+
+    venvmod_case_cmd(initialized_venv, case)
+
+
+@pytest.fixture(scope="session", name="appli_venv")
+def fixture_appli_venv(initialized_venv: Path) -> Path:
+    """Adds the ``APPLI_NAME`` appli modulefile to the initialized virtual environment.
 
-    appli_name = "Ap-p_Li.1"
+    Returns
+    -------
+    Path
+        Path to the virtual environment.
+    """
 
     # xfail before add-appli
-    venvmod_cmd(args=["venvmod-cmd-setenv", str(venv_path),
-                      "--appli", appli_name, "TEST_VAR", "test_value"],
+    venvmod_cmd(args=["venvmod-cmd-setenv", str(initialized_venv),
+                      "--appli", APPLI_NAME, "TEST_VAR", "test_value"],
                 xfail=True, err_msg="You can\'t add command to non exsting modulefile")
 
-    venvmod_cmd(args=["venvmod-add-appli", str(venv_path), appli_name, "--verbose"], xfail=False)
-    venvmod_cmd(args=["venvmod-cmd-setenv", str(venv_path),
-                      "--appli", appli_name, "TEST_VAR", "test_value"],
+    venvmod_cmd(args=["venvmod-add-appli", str(initialized_venv), APPLI_NAME, "--verbose"],
+                xfail=False)
+
+    return initialized_venv
+
+
+def test_appli_cmds(appli_venv: Path):
+    """Tests a command on the appli modulefile."""
+
+    venvmod_cmd(args=["venvmod-cmd-setenv", str(appli_venv),
+                      "--appli", APPLI_NAME, "TEST_VAR", "test_value"],
                 xfail=False)
 
-    all_venvmod_commands(venv_path, test_scripts, appli=appli_name)
+
+@pytest.mark.parametrize("case", VENVMOD_CASES)
+def test_appli_cases(appli_venv: Path, case: Tuple):
+    """Tests all commands on an appli modulefile."""
+
+    venvmod_case_cmd(appli_venv, case, appli=APPLI_NAME)
+
+
+def test_read_env_applis(initialized_venv: Path):
+    """Tests appli modulefiles filled from environment variables."""
+
+    venv_path = initialized_venv
+    test_scripts = get_test_scripts(venv_path)
 
     # Appli 2 : load from env var
     venvmod_cmd(args=["venvmod-add-appli", str(venv_path), "appli-2", "--verbose"], xfail=False)
 
+    # 'APPLI_2XPATH' has no '_' separator after the appli name: it is not read as 'PATH'
+    appli_2_env = create_subenv(get_env_prefix("appli-2"), test_scripts)
+    appli_2_env[f"{get_env_prefix('appli-2')}XPATH"] = "/not/an/appli/path"
     venvmod_cmd(args=["venvmod-cmd-read-env", venv_path, "--appli", "appli-2"],
-                xfail=False, env=create_subenv("APPLI_2"))
+                xfail=False, env=appli_2_env)
+    assert "/not/an/appli/path" not in get_module_filepath(
+        virtual_env=venv_path, appli_name="appli-2").read_text(encoding='utf-8')
 
     # Appli 3 : load from env var at creation
     venvmod_cmd(args=["venvmod-add-appli", str(venv_path), "appli-3",
-                      "--read-env", "--verbose"], xfail=False, env=create_subenv("APPLI_3"))
+                      "--read-env", "--verbose"], xfail=False,
+                env=create_subenv(get_env_prefix("appli-3"), test_scripts))
 
     # Appli 4 : disconnected appli
     venvmod_cmd(args=["venvmod-add-appli", str(venv_path), "disconnected-appli",
-                      "--disconnect", "--verbose"], xfail=False, env=create_subenv("APPLI_4"))
+                      "--disconnect", "--verbose"], xfail=False,
+                env=create_subenv("APPLI_4", test_scripts))
 
-    result = subprocess.run(  # pylint: disable=subprocess-run-check
-        args=[get_shell_command(), "-c", f". {(venv_path / 'bin' / 'activate')}"],
-        stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-    assert get_results(result=result)
 
-    assert "This is test modulefile" in result.stderr.decode()
+def test_test_imports(initialized_venv: Path):
+    """Tests ``venvmod-test-import``."""
 
-    venvmod_cmd(args=["venvmod-test-import", str(venv_path), "venvmod", "typing", "sys"],
+    venv_path = initialized_venv
+
+    venvmod_cmd(args=["venvmod-test-import", str(venv_path), "venvmod", "typing", "sys",
+                      "--verbose"],
+                xfail=False)
+
+    venvmod_cmd(args=["venvmod-test-import", str(venv_path), "venvmod", "typing", "sys",
+                      "--locate-only"],
                 xfail=False)
 
     venvmod_cmd(args=["venvmod-test-import", str(venv_path), "not_a_module"],
                 xfail=True)
 
+    venvmod_cmd(args=["venvmod-test-import", str(venv_path), "not_a_module", "--locate-only"],
+                xfail=True)
+
+    # Module without __spec__ in sys.modules: find_spec raises ValueError
+    with mock.patch.dict(sys.modules, {"venvmod_no_spec": ModuleType("venvmod_no_spec")}):
+        venvmod_cmd(args=["venvmod-test-import", str(venv_path), "venvmod_no_spec",
+                          "--locate-only"],
+                    xfail=False)
+
+
+def test_test_imports_main_thread(initialized_venv: Path, tmp_path: Path,
+                                  monkeypatch: pytest.MonkeyPatch):
+    """Tests ``venvmod-test-import`` on a module with main-thread only side effects."""
+
+    (tmp_path / "venvmod_signal_module.py").write_text(
+        data="import signal\nsignal.signal(signal.SIGUSR1, signal.getsignal(signal.SIGUSR1))\n",
+        encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    with mock.patch.dict(sys.modules):
+        venvmod_cmd(args=["venvmod-test-import", str(initialized_venv),
+                          "venvmod_signal_module"],
+                    xfail=False)
+
+
+def test_activate(initialized_venv: Path):
+    """Tests activation and deactivation of the virtual environment."""
+
+    venv_path = initialized_venv
+
+    venvmod_cmd(args=["venvmod-cmd-prepend-path", str(venv_path),
+                      "PATH", "/path/to/activate1", "/path/to/activate2"],
+                xfail=False)
+
     initial_path = os.environ['PATH']
 
+    # A single shell session checks the activation log and the PATH before and after deactivate
     result = subprocess.run(  # pylint: disable=subprocess-run-check
         f'. {venv_path}/bin/activate && echo "PATH=$PATH" && deactivate && echo "PATH=$PATH"',
         shell=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE,
         executable=get_shell_command())
+    assert get_results(result=result)
+
+    assert "This is test modulefile" in result.stderr.decode()
 
     path_lines: List[str] = []
     # print("result.stdout", result.stdout.decode())
@@ -287,11 +488,75 @@ def test_venvmod_cmds():
 
     # print(path_lines)
     assert len(path_lines) == 2
-    assert "value1:value2" in path_lines[0]
+    assert "/path/to/activate1:/path/to/activate2:" in path_lines[0]
+    # '{prefix}_PATH' read by 'initialize --read-env' is written as a single multi-value
+    # 'prepend-path' line: the values keep their order
+    assert "/path/to/bin1:/path/to/bin2:" in path_lines[0]
     assert path_lines[0] != path_lines[1]
     assert path_lines[1].replace("PATH=", "").replace(
         f"{venv_path}/opt/modulefiles/bin:", "") == initial_path
 
 
+def test_module_installer_download(tmp_path: Path):
+    """Tests the Environment Module tarball download and its reuse from the cache."""
+
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.raw = io.BytesIO(b"modules tarball")
+
+    installer = ModuleInstaller(version_or_path="5.4.0",
+                                install_prefix=tmp_path / "opt",
+                                cache_directory=tmp_path)
+    with mock.patch("venvmod.modulefile.requests.get", return_value=response) as get, \
+            mock.patch("venvmod.modulefile.os.replace", wraps=os.replace) as replace:
+        tar_file = installer._download()  # pylint: disable=protected-access
+
+        assert tar_file == tmp_path / "modules-5.4.0.tar.gz"
+        assert tar_file.read_bytes() == b"modules tarball"
+        replace.assert_called_once_with(tmp_path / "modules-5.4.0.tar.gz.part", tar_file)
+        assert not (tmp_path / "modules-5.4.0.tar.gz.part").exists()
+        response.raise_for_status.assert_called_once()
+
+        # The cached tarball is reused
+        assert installer._download() == tar_file  # pylint: disable=protected-access
+        get.assert_called_once()
+        replace.assert_called_once()
+
+
+def test_remove_duplicates():
+    """Tests ``remove_duplicates`` keeps the first occurrence order."""
+
+    assert remove_duplicates(iter(["b", "a", "b", "c", "a"])) == ["b", "a", "c"]
+    # unhashable values
+    assert remove_duplicates([["b"], ["a"], ["b"], ["c"], ["a"]]) == [["b"], ["a"], ["c"]]
+
+
+def test_module_installer_run(tmp_path: Path):
+    """Tests the Environment Module build commands, with ``make clean`` only on reused sources."""
+
+    def run_installer(version_or_path: str, cache_directory: Path) -> List[List[str]]:
+        with mock.patch("venvmod.modulefile.subprocess.run") as run:
+            ModuleInstaller(version_or_path=version_or_path,
+                            install_prefix=tmp_path / "opt",
+                            cache_directory=cache_directory).run()
+        return [call[0][0] for call in run.call_args_list]
+
+    # Freshly extracted tarball
+    commands = run_installer("5.4.0", tmp_path / "cache")
+    assert (tmp_path / "cache" / "modules-5.4.0" / "configure").exists()
+    assert ["make", "clean"] not in commands
+    assert commands[-1][-1] == "install"
+
+    # Build directory left by a previous run
+    assert ["make", "clean"] in run_installer("5.4.0", tmp_path / "cache")
+
+    # User source directory
+    (tmp_path / "modules-src").mkdir()
+    (tmp_path / "modules-src" / "configure").write_text(data="", encoding='utf-8')
+    assert ["make", "clean"] in run_installer(str(tmp_path / "modules-src"),
+                                              tmp_path / "src-cache")
+    assert (tmp_path / "src-cache" / "modules-src" / "configure").exists()
+
+
 if __name__ == "__main__":
-    test_venvmod_cmds()
+    sys.exit(pytest.main([__file__]))